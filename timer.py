@@ -1,11 +1,67 @@
 #!/usr/bin/env python3
 import customtkinter as ctk
+import os
+import shutil
+import struct
 import subprocess
+import tempfile
+import threading
 import time
 from typing import Optional
 from dataclasses import dataclass
 from enum import Enum
-import re
+
+_ALLOWED = frozenset('0123456789.')
+_DEBOUNCE_MS = 50
+_NS_PER_S = 1_000_000_000
+_NS_PER_MS = 1_000_000
+_PAD2 = [f"{i:02d}" for i in range(100)]
+_THEME_INITIALIZED = False
+# Compresiones AIFF-C cuyo silencio son bytes en cero
+_AIFC_PCM = frozenset((b'NONE', b'sowt', b'fl32', b'fl64'))
+
+def _ensure_theme() -> None:
+    """Aplica el tema de customtkinter una sola vez por proceso"""
+    global _THEME_INITIALIZED
+    if _THEME_INITIALIZED:
+        return
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("blue")
+    _THEME_INITIALIZED = True
+
+def _remove_file(path: str) -> None:
+    """Elimina un archivo ignorando si ya no existe"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _aiff_chunks(data: bytes) -> list:
+    """Separa un archivo AIFF/AIFF-C en sus chunks (id, contenido)"""
+    if data[:4] != b'FORM' or data[8:12] not in (b'AIFF', b'AIFC'):
+        raise ValueError("el archivo no es AIFF")
+    chunks = []
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size, = struct.unpack('>L', data[pos + 4:pos + 8])
+        chunks.append((chunk_id, data[pos + 8:pos + 8 + size]))
+        pos += 8 + size + (size & 1)
+    return chunks
+
+def _aiff_bytes(form_type: bytes, chunks: list) -> bytes:
+    """Arma un archivo AIFF/AIFF-C a partir de sus chunks"""
+    body = b''.join(
+        chunk_id + struct.pack('>L', len(content)) + content + b'\x00' * (len(content) & 1)
+        for chunk_id, content in chunks
+    )
+    return b'FORM' + struct.pack('>L', 4 + len(body)) + form_type + body
+
+def _extended_to_float(raw: bytes) -> float:
+    """Convierte el float IEEE de 80 bits del chunk COMM"""
+    exponent, mantissa = struct.unpack('>HQ', raw)
+    sign = -1.0 if exponent & 0x8000 else 1.0
+    return sign * mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63)
 
 class TimerState(Enum):
     STOPPED = "stopped"
@@ -26,26 +82,42 @@ class TimerConfig:
 class ModernTimer:
     def __init__(self, config: Optional[TimerConfig] = None):
         self.config = config or TimerConfig()
+        self._afplay = shutil.which('afplay') or '/usr/bin/afplay'
         self.setup_window()
         self.state = TimerState.STOPPED
         self.remaining = 0
+        self._deadline_ns = 0
+        self._pause_offset_ns = 0
+        self._after_id: Optional[str] = None
+        self._last_text = ""
+        self._last_trigger_time = -_DEBOUNCE_MS
+        self._key_dispatch = {
+            'd': lambda: self.process_time_input('d'),
+            'f': lambda: self.process_time_input('f'),
+        }
         self.dialog: Optional[ctk.CTkToplevel] = None
+        self._alarm_thread: Optional[threading.Thread] = None
+        self._alarm_proc: Optional[subprocess.Popen] = None
+        self._alarm_cancel = threading.Event()
         self.setup_ui()
         self.show_time_input()
 
     def setup_window(self) -> None:
         """Configuración inicial de la ventana"""
-        ctk.set_appearance_mode("dark")
-        ctk.set_default_color_theme("blue")
+        _ensure_theme()
         
         self.root = ctk.CTk()
         self.root.title("Temporizador")
         self.root.geometry(self.config.window_size)
         
         self.root.bind('<Key>', self.handle_key)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
     
     def setup_ui(self) -> None:
         """Configuración de la interfaz de usuario"""
+        self._font_large = ctk.CTkFont(size=self.config.font_size_large, weight="bold")
+        self._font_normal = ctk.CTkFont(size=self.config.font_size_normal)
+        
         self.main_frame = ctk.CTkFrame(self.root)
         self.main_frame.pack(expand=True, fill="both", padx=self.config.padding, pady=self.config.padding)
         
@@ -57,7 +129,7 @@ class ModernTimer:
         self.time_label = ctk.CTkLabel(
             self.main_frame, 
             text="00:00:00",
-            font=ctk.CTkFont(size=self.config.font_size_large, weight="bold")
+            font=self._font_large
         )
         self.time_label.pack(pady=30)
     
@@ -79,25 +151,42 @@ class ModernTimer:
                 text=text,
                 command=command,
                 width=100,
-                font=ctk.CTkFont(size=self.config.font_size_normal),
+                font=self._font_normal,
                 state="normal" if enabled else "disabled"
             )
             button.pack(side="left", padx=5)
             self.buttons[text.lower()] = button
 
+    def _set_button_states(self, states: dict) -> None:
+        """Aplica de una vez el estado de varios botones"""
+        for name, state in states.items():
+            self.buttons[name].configure(state=state)
+
     def validate_input(self, input_text: str) -> bool:
         """Valida que el input sea solo números y punto decimal"""
-        return re.match(r'^\d+(\.\d+)?$', input_text)
+        dots = input_text.count('.')
+        if dots > 1:
+            return False
+        # Mismo criterio que _ALLOWED y float(): dígitos ASCII y un punto opcional
+        digits = input_text.replace('.', '', 1) if dots else input_text
+        return digits.isascii() and digits.isdecimal()
 
     def handle_key(self, event) -> Optional[str]:
         """Maneja las teclas D y F para iniciar el temporizador"""
-        key = event.char.lower()
+        char = event.char
+        if not char:
+            return None
         
-        if key in ['d', 'f']:
-            self.process_time_input(key)
+        handler = self._key_dispatch.get(char.lower())
+        if handler is not None:
+            # Ignora la autorrepetición de la tecla usando la marca de tiempo de Tk
+            if 0 <= event.time - self._last_trigger_time < _DEBOUNCE_MS:
+                return "break"
+            self._last_trigger_time = event.time
+            handler()
             return "break"
         
-        if event.char and not (event.char.isdigit() or event.char == '.'):
+        if char not in _ALLOWED:
             return "break"
         
         return None
@@ -114,12 +203,18 @@ class ModernTimer:
                 raise ValueError
             
             self.remaining = int(time_val * (60 if key == 'd' else 1))
-            self.dialog.destroy()
+            self.hide_time_input()
             self.start_countdown()
             
         except ValueError:
             self.show_error_message("Por favor ingrese un número válido mayor que 0")
 
+    def hide_time_input(self) -> None:
+        """Oculta el diálogo de tiempo para reutilizarlo después"""
+        self.time_entry.delete(0, 'end')
+        self.dialog.grab_release()
+        self.dialog.withdraw()
+
     def show_error_message(self, message: str) -> None:
         """Muestra un mensaje de error temporal"""
         error_label = ctk.CTkLabel(
@@ -132,11 +227,21 @@ class ModernTimer:
 
     def show_time_input(self) -> None:
         """Muestra el diálogo para ingresar el tiempo"""
+        self._ensure_dialog()
+        self.time_entry.delete(0, 'end')
+        self.dialog.deiconify()
+        self.dialog.grab_set()
+        self.time_entry.focus()
+    
+    def _ensure_dialog(self) -> None:
+        """Construye el diálogo una sola vez y lo reutiliza mientras exista"""
+        if self.dialog is not None and self.dialog.winfo_exists():
+            return
+        
         self.dialog = ctk.CTkToplevel(self.root)
         self.dialog.title("Ingresar Tiempo")
         self.dialog.geometry("300x200")
         self.dialog.transient(self.root)
-        self.dialog.grab_set()
         
         self.setup_input_dialog()
     
@@ -148,7 +253,7 @@ class ModernTimer:
         instructions = ctk.CTkLabel(
             input_frame,
             text="Ingrese el tiempo y presione:\n'D' para minutos\n'F' para segundos",
-            font=ctk.CTkFont(size=self.config.font_size_normal),
+            font=self._font_normal,
             justify="left"
         )
         instructions.pack(pady=(0, 20))
@@ -157,39 +262,45 @@ class ModernTimer:
             input_frame,
             placeholder_text="Ingrese el valor",
             width=200,
-            font=ctk.CTkFont(size=self.config.font_size_normal)
+            font=self._font_normal
         )
         self.time_entry.pack(pady=10)
         self.time_entry.bind('<Key>', self.handle_key)
-        self.time_entry.focus()
 
     def format_time(self) -> str:
         """Formatea el tiempo restante en formato HH:MM:SS"""
-        hours = self.remaining // 3600
-        minutes = (self.remaining % 3600) // 60
-        seconds = self.remaining % 60
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        minutes, seconds = divmod(self.remaining, 60)
+        hours, minutes = divmod(minutes, 60)
+        return (_PAD2[hours] if hours < 100 else str(hours)) + ":" + _PAD2[minutes] + ":" + _PAD2[seconds]
     
     def update_display(self) -> None:
-        """Actualiza el display del tiempo"""
-        self.time_label.configure(text=self.format_time())
+        """Actualiza el display del tiempo solo si el texto cambió"""
+        text = self.format_time()
+        if text != self._last_text:
+            self.time_label.configure(text=text)
+            self._last_text = text
     
     def start_countdown(self) -> None:
         """Inicia la cuenta regresiva"""
         self.state = TimerState.RUNNING
-        self.buttons['pausar'].configure(state="normal")
-        self.buttons['detener'].configure(state="normal")
-        self.buttons['iniciar'].configure(state="disabled")
+        self._set_button_states({'iniciar': "disabled", 'pausar': "normal", 'detener': "normal"})
+        self.cancel_tick()
+        self._deadline_ns = time.monotonic_ns() + self.remaining * _NS_PER_S
         self.update_timer()
     
     def update_timer(self) -> None:
-        """Actualiza el temporizador"""
-        if self.state == TimerState.RUNNING and self.remaining > 0:
-            self.update_display()
-            self.remaining -= 1
-            self.root.after(1000, self.update_timer)
-        elif self.state == TimerState.RUNNING and self.remaining <= 0:
-            self.update_display()
+        """Actualiza el temporizador según el instante límite"""
+        self._after_id = None
+        if self.state != TimerState.RUNNING:
+            return
+        left_ns = self._deadline_ns - time.monotonic_ns()
+        self.remaining = max(0, -(-left_ns // _NS_PER_S))
+        self.update_display()
+        if self.remaining > 0:
+            # Próximo tick justo cuando el segundo mostrado deja de ser válido
+            delay_ms = -(-(left_ns - (self.remaining - 1) * _NS_PER_S) // _NS_PER_MS)
+            self._after_id = self.root.after(max(1, delay_ms), self.update_timer)
+        else:
             self.play_alarm()
             self.state = TimerState.STOPPED
             self.root.after(1000, self.root.destroy)
@@ -203,33 +314,118 @@ class ModernTimer:
             self.state = TimerState.PAUSED if self.state == TimerState.RUNNING else TimerState.RUNNING
             self.buttons['pausar'].configure(text="Reanudar" if self.state == TimerState.PAUSED else "Pausar")
             if self.state == TimerState.RUNNING:
+                self._deadline_ns = time.monotonic_ns() + self._pause_offset_ns
                 self.update_timer()
+            else:
+                self._pause_offset_ns = self._deadline_ns - time.monotonic_ns()
+                self.cancel_tick()
+
+    def cancel_tick(self) -> None:
+        """Cancela el próximo tick programado, si lo hay"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
     
     def stop_timer(self) -> None:
         """Detiene el temporizador"""
         self.state = TimerState.STOPPED
+        self.cancel_tick()
+        self.cancel_alarm()
         self.remaining = 0
         self.update_display()
-        self.buttons['iniciar'].configure(state="normal")
-        self.buttons['pausar'].configure(state="disabled")
-        self.buttons['detener'].configure(state="disabled")
+        self._set_button_states({'iniciar': "normal", 'pausar': "disabled", 'detener': "disabled"})
     
+    def build_alarm_file(self) -> Optional[str]:
+        """Genera un único archivo con todas las repeticiones de la alarma"""
+        try:
+            with open(self.config.sound_file, 'rb') as src:
+                data = src.read()
+            form_type = data[8:12]
+            chunks = _aiff_chunks(data)
+            found = dict(chunks)
+            comm, ssnd = found[b'COMM'], found[b'SSND']
+            channels, nframes, bits = struct.unpack('>hLh', comm[:8])
+            if form_type == b'AIFC' and comm[18:22] not in _AIFC_PCM:
+                raise ValueError("compresión de audio no soportada")
+            rate = _extended_to_float(comm[8:18])
+            frame_size = channels * ((bits + 7) // 8)
+            offset, = struct.unpack('>L', ssnd[:4])
+            frames = ssnd[8 + offset:8 + offset + nframes * frame_size]
+            silence_frames = int(rate * 0.1)
+            
+            repetitions = self.config.repetitions
+            sound = (frames + b'\x00' * (silence_frames * frame_size)) * repetitions
+            total_frames = (len(frames) // frame_size + silence_frames) * repetitions
+            new_comm = comm[:2] + struct.pack('>L', total_frames) + comm[6:]
+            new_ssnd = struct.pack('>LL', 0, 0) + sound
+            output = _aiff_bytes(form_type, [
+                (chunk_id, new_comm if chunk_id == b'COMM' else new_ssnd if chunk_id == b'SSND' else content)
+                for chunk_id, content in chunks
+            ])
+            
+            with tempfile.NamedTemporaryFile(suffix='.aiff', delete=False) as tmp:
+                path = tmp.name
+        except (KeyError, ValueError, struct.error, OSError) as e:
+            print(f"Error al preparar el sonido: {e}")
+            return None
+        
+        try:
+            with open(path, 'wb') as dst:
+                dst.write(output)
+            return path
+        except OSError as e:
+            print(f"Error al preparar el sonido: {e}")
+            _remove_file(path)
+            return None
+
     def play_alarm(self) -> None:
-        """Reproduce el sonido de alarma"""
+        """Reproduce el sonido de alarma en segundo plano"""
+        self._alarm_cancel.clear()
+        self._alarm_thread = threading.Thread(target=self._play_alarm_worker, daemon=True)
+        self._alarm_thread.start()
+
+    def wait_alarm(self) -> None:
+        """Espera a que termine la alarma en curso, si la hay"""
+        if self._alarm_thread is not None:
+            self._alarm_thread.join()
+
+    def cancel_alarm(self) -> None:
+        """Interrumpe la alarma en curso sin esperar las repeticiones"""
+        self._alarm_cancel.set()
+        proc = self._alarm_proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+    def close(self) -> None:
+        """Cierra la ventana cancelando la alarma pendiente"""
+        self.cancel_alarm()
+        self.root.destroy()
+
+    def _play_alarm_worker(self) -> None:
+        """Reproduce las repeticiones de la alarma fuera del hilo de Tk"""
+        # El archivo se genera al sonar la alarma y se elimina al terminar
+        path = self.build_alarm_file()
         try:
-            for _ in range(self.config.repetitions):
-                subprocess.run([
-                    'afplay',
-                    '-v', self.config.volume,
-                    self.config.sound_file
-                ])
-                time.sleep(0.1)
+            cmd = (self._afplay, '-v', self.config.volume, path or self.config.sound_file)
+            for _ in range(1 if path else self.config.repetitions):
+                if self._alarm_cancel.is_set():
+                    break
+                # Ruta absoluta y close_fds=False permiten que Popen use posix_spawn
+                proc = subprocess.Popen(cmd, close_fds=False)
+                self._alarm_proc = proc
+                if self._alarm_cancel.is_set():
+                    proc.terminate()
+                proc.wait()
         except Exception as e:
             print(f"Error al reproducir el sonido: {e}")
+        finally:
+            if path:
+                _remove_file(path)
 
 def main():
     app = ModernTimer()
     app.root.mainloop()
+    app.wait_alarm()
 
 if __name__ == "__main__":
     main()